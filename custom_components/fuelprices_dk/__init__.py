@@ -17,8 +17,7 @@ from .const import (
     UPDATE_INTERVAL,
 )
 
-_LOGGER: logging.Logger = logging.getLogger(__package__)
-_LOGGER = logging.getLogger(__name__)
+_LOGGER: logging.Logger = logging.getLogger(__name__)
 
 
 async def async_setup(hass, config):
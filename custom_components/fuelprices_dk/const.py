@@ -8,5 +8,4 @@ CREDITS = [
     {"Fork and maintainence": "r-poulsen (https://github.com/r-poulsen)"},
 ]
 DOMAIN = "fuelprices_dk-2"
-PATH = "./custom_components/" + DOMAIN + "/"
 UPDATE_INTERVAL = 60
@@ -2,40 +2,55 @@
 
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
+from itertools import islice
 import re
 import shutil
+import ssl
 import subprocess
-import json
 from typing import List
-from bs4 import BeautifulSoup as BS
+from zoneinfo import ZoneInfo
 import requests
-import pytz
-
+import lxml.html
+from lxml import etree
 from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
 from urllib3.poolmanager import PoolManager
-from urllib3.util import ssl_
+from urllib3.util import Retry, ssl_
 
-import ssl
+# orjson decodes JSON a good deal faster than the standard library, use it when available
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
 
-# from requests.adapters import HTTPAdapter
-# from urllib3.poolmanager import PoolManager
-# from urllib3.util import ssl_
+DK_TZ = ZoneInfo("Europe/Copenhagen")
 
-# from urllib3.util.ssl_ import create_urllib3_context
-import urllib3.util.ssl_
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
+_LOGGER: logging.Logger = logging.getLogger(__name__)
 
-from .const import (
-    PATH,
-)
+# Bytes of HTML handed to the parser at a time when streaming table rows
+_PARSE_CHUNK_SIZE = 16 * 1024
+
+# The XPath expressions evaluated for every row, compiled once
+_TABLE_CELLS = etree.XPath(".//td")
+_GRID_CELLS = etree.XPath('.//div[@role="gridcell"]')
 
-DK_TZ = pytz.timezone("Europe/Copenhagen")
+# Text surrounding the prices on the different websites
+_PRICE_STRIP_RE = re.compile(r"Pris inkl\. moms: |\s*kr(?:/kWh|\.)?\s*")
+# Danish decimal comma to decimal point
+_PRICE_TRANS = str.maketrans({",": "."})
 
-_LOGGER: logging.Logger = logging.getLogger(__package__)
-_LOGGER = logging.getLogger(__name__)
+# The charset declared in a Content-Type header
+_CHARSET_RE = re.compile(r'''charset=["']?([^\s;"']+)''', re.IGNORECASE)
+
+# Uno-X embeds one JSON object per price, matched against the raw response bytes
+_UNOX_RE = re.compile(rb'({"Date[^}]*})')
 
 DEFAULT_PRICE_TYPE = "pump"
 DIESEL = "diesel"
@@ -47,22 +62,44 @@ OCTANE_95_PLUS = "oktan 95+"
 OCTANE_100 = "oktan 100"
 
 
+def _declared_encoding(response: requests.Response) -> str | None:
+    # Only the charset the server actually declared. requests falls back to ISO-8859-1 for
+    # any text/* response, which would keep lxml from reading a <meta charset> in the page.
+    match = _CHARSET_RE.search(response.headers.get("Content-Type", ""))
+    return match.group(1) if match else None
+
+
+def _refresh_timestamp() -> str:
+    return datetime.now(DK_TZ).strftime("%d/%m/%Y, %H:%M:%S")
+
+
+@dataclass(slots=True)
+class Product:
+    """
+    A product offered by a fuel company.
+
+    Attributes:
+        name (str): The name of the product as used by the fuel company.
+        price (float | None): The latest price of the product.
+        last_update (str | None): When the price was last updated.
+        product_code (int | None): The product code used by the F24/Q8 JSON API.
+        kind (str): The kind of product, "fuel" or "electricity".
+        ocr_crop (tuple | None): The ssocr crop (x, y, width, height) of the price in Go'On's image.
+        date_unix (int | None): The Uno-X timestamp of the price.
+    """
+
+    name: str
+    price: float | None = None
+    last_update: str | None = None
+    product_code: int | None = None
+    kind: str = "fuel"
+    ocr_crop: tuple | None = None
+    date_unix: int | None = None
+
+
 class FuelPrices:
     """Class to manage fuel prices from different companies."""
 
-    # All the supported companies
-    company_keys: List[str] = [
-        'circlek',
-        'f24',
-        'goon',
-        'ingo',
-        'oil',
-        'ok',
-        'q8',
-        'shell',
-        'unox'
-    ]
-
     _companies: dict[str, FuelCompany]
 
     def __init__(self):
@@ -79,6 +116,13 @@ class FuelPrices:
             if c is not None:
                 self._companies[k] = c
 
+    @property
+    def company_keys(self) -> List[str]:
+        """
+        Returns the keys of all the supported companies, as registered with register_company.
+        """
+        return sorted(_COMPANY_REGISTRY)
+
     @property
     def companies(self) -> dict[str, FuelCompany]:
         """
@@ -95,42 +139,146 @@ class FuelPrices:
         """
         Refreshes the prices for all companies.
 
-        This method iterates through all the companies and calls the `refresh_prices` method for
-        each company. If a `ReadTimeout` or `ConnectTimeout` exception occurs during the refresh
-        process, a warning message is logged.
+        This method calls the `refresh` method for each company in a pool of threads, using the
+        same timestamp for all of them. The companies live on different hosts, so the total time
+        is roughly that of the slowest company. If a timeout, connection error or HTTP error
+        occurs during the refresh process, a warning message is logged.
 
         :return: None
         """
-        for _, company in self.companies.items():
-            try:
-                company.refresh_prices()
-            except requests.exceptions.ReadTimeout:
-                logging.warning(
+        refresh_ts = _refresh_timestamp()
+        with ThreadPoolExecutor(max_workers=max(len(self._companies), 1)) as executor:
+            futures = [
+                executor.submit(self._refresh_company, company, refresh_ts)
+                for company in self._companies.values()
+            ]
+            for future in as_completed(futures):
+                future.result()
+
+    async def async_refresh(self):
+        """
+        Refreshes the prices for all companies concurrently.
+
+        Every company lives on its own host, so instead of waiting for them one by one, each
+        `refresh` call is handed to the event loop's default executor and awaited together.
+        The total time is then roughly that of the slowest company.
+
+        Timeouts, connection errors and HTTP errors are logged as in `refresh`. Any other
+        exception is raised once all the companies have had their go.
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        refresh_ts = _refresh_timestamp()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(None, self._refresh_company, company, refresh_ts)
+                for company in self.companies.values()
+            ),
+            return_exceptions=True
+        )
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    def _refresh_company(self, company: FuelCompany, refresh_ts: str):
+        try:
+            company.refresh(refresh_ts)
+        except requests.exceptions.ReadTimeout:
+            _LOGGER.warning(
+                "Read timeout when refreshing prices from %s", company.name)
+        except requests.exceptions.ConnectTimeout:
+            _LOGGER.warning(
+                "Connect timeout when refreshing prices from %s", company.name)
+        except requests.exceptions.ConnectionError as e:
+            # Once the retries run out, a read timeout surfaces as a ConnectionError
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                _LOGGER.warning(
                     "Read timeout when refreshing prices from %s", company.name)
-            except requests.exceptions.ConnectTimeout:
-                logging.warning(
-                    "Connect timeout when refreshing prices from %s", company.name)
-            except requests.exceptions.HTTPError as e:
-                logging.warning(
-                    "HTTP error when refreshing prices from %s: %s", company.name, e)
+            else:
+                _LOGGER.warning(
+                    "Connection error when refreshing prices from %s: %s", company.name, e)
+        except requests.exceptions.RetryError as e:
+            _LOGGER.warning(
+                "Too many retries when refreshing prices from %s: %s", company.name, e)
+        except requests.exceptions.HTTPError as e:
+            _LOGGER.warning(
+                "HTTP error when refreshing prices from %s: %s", company.name, e)
 
 
 class TlsAdapter(HTTPAdapter):
 
     def __init__(self, ssl_options=0, **kwargs):
         self.ssl_options = ssl_options
+        # Build the SSL context once, every pool created by this adapter shares it
+        self.ssl_context = ssl_.create_urllib3_context(
+            ciphers='AES128-GCM-SHA256:ECDHE-RSA-AES128-SHA256:AES256-SHA',
+            cert_reqs=ssl.CERT_REQUIRED, options=self.ssl_options)
         super(TlsAdapter, self).__init__(**kwargs)
 
     def init_poolmanager(self, *pool_args, **pool_kwargs):
-        ctx = ssl_.create_urllib3_context(
-            ciphers='AES128-GCM-SHA256:ECDHE-RSA-AES128-SHA256:AES256-SHA', cert_reqs=ssl.CERT_REQUIRED, options=self.ssl_options)
         self.poolmanager = PoolManager(
             *pool_args,
-            ssl_context=ctx,
+            ssl_context=self.ssl_context,
             **pool_kwargs
         )
 
 
+# Transient errors are retried with a backoff, so a hiccup does not leave the prices stale
+# until the next refresh. When the retries run out the last response is returned, so
+# raise_for_status still reports it as before.
+_RETRY = Retry(
+    total=3, connect=2, read=2, backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST"]),
+    raise_on_status=False
+)
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+
+    session.headers.update({
+        'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        + "AppleWebKit/537.36 (KHTML, like Gecko) "
+        + "Chrome/80.0.3987.149 Safari/537.36",
+        'Connection': "keep-alive",
+    })
+
+    # Keep the connections to all the hosts alive between refreshes so we do not pay for
+    # the TCP and TLS handshake every time
+    adapter = HTTPAdapter(
+        pool_connections=16, pool_maxsize=16, max_retries=_RETRY)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+# The session shared by the fuel companies
+_SHARED_SESSION = _create_session()
+
+
+# The FuelCompany subclasses by their company key, filled in by register_company
+_COMPANY_REGISTRY: dict[str, type[FuelCompany]] = {}
+
+
+def register_company(company_key: str):
+    """
+    Class decorator registering a FuelCompany subclass under the given company key.
+
+    Args:
+        company_key (str): The key used to create the company through FuelCompany.factory
+    """
+    def decorator(company_class: type[FuelCompany]) -> type[FuelCompany]:
+        _COMPANY_REGISTRY[company_key] = company_class
+        return company_class
+
+    return decorator
+
+
 class FuelCompany:
     """
     Represents a fuel company.
@@ -138,17 +286,20 @@ class FuelCompany:
     Attributes:
         _name (str): The name of the fuel company.
         _url (str): The URL of the fuel company's website.
-        _products (dict[str, dict]): A dictionary of products offered by the fuel company.
+        _products (dict[str, Product]): A dictionary of products offered by the fuel company.
         _key (str): The key representing the fuel company.
     """
 
     _name: str | None = None
     _url: str | None = None
-    _products: dict[str, dict]
-    _timeout = 5
+    _products: dict[str, Product]
+    _products_name_key_idx: dict[str, str]
+    # Connect and read timeouts, a host that cannot be reached fails fast
+    _timeout = (3, 10)
     # _key: str | None = None
 
     _price_type: str = DEFAULT_PRICE_TYPE
+    _refresh_ts: str | None = None
 
     """ 
     The keys of the products that we subscribe to, e.g. "oktan 95", "oktan 100", "diesel", "diesel+"
@@ -158,24 +309,35 @@ class FuelCompany:
             self, subscribe_products: List[str] = None
     ):
 
-        self._session = requests.Session()
-
-        self._session.headers.update({
-            'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            + "AppleWebKit/537.36 (KHTML, like Gecko) "
-            + "Chrome/80.0.3987.149 Safari/537.36"
-        })
+        self._session = _SHARED_SESSION
+        self._cache: dict[str, requests.Response] = {}
 
         # if subscribe_products is supplied, remove all products from _products that
         # are not in subscribe_products
-        if subscribe_products is not None:
-            self._products = {
-                k: v for k, v in self._products.items() if k in subscribe_products
-            }
+        # Each instance gets its own copy of the products, as the prices are written into them
+        subscribe_set = frozenset(
+            subscribe_products) if subscribe_products else None
+        self._products = {
+            k: replace(v) for k, v in self._products.items()
+            if subscribe_set is None or k in subscribe_set
+        }
 
-        # Also, make a simpler, reverse look index of the products
-        self.products_name_key_idx = {
-            v['name']: k for k, v in self._products.items()
+        # Also, make a simpler, reverse look index of the products. Without a filter it is
+        # the one already built for the class.
+        if subscribe_set is None:
+            self.products_name_key_idx = self._products_name_key_idx
+        else:
+            self.products_name_key_idx = {
+                v.name: k for k, v in self._products.items()
+            }
+        # ... and a set of the product keys for quick membership tests
+        self._product_keys = frozenset(self.products_name_key_idx.values())
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The reverse look index of all the products of the company, built once per class
+        cls._products_name_key_idx = {
+            v.name: k for k, v in getattr(cls, "_products", {}).items()
         }
 
     @classmethod
@@ -190,11 +352,10 @@ class FuelCompany:
         Returns:
             FuelCompany | None: FuelCompany subclass instance if company_key is valid or None
         """
-        class_name = __class__.__name__+company_key.capitalize()
+        company_class = _COMPANY_REGISTRY.get(company_key)
 
-        if class_name in globals():
-            fuel_company = globals()[class_name](subscribe_products)
-            return fuel_company
+        if company_class is not None:
+            return company_class(subscribe_products)
 
         _LOGGER.warning("Unknown company key: %s", company_key)
         return None
@@ -227,6 +388,19 @@ class FuelCompany:
         """
         return self._price_type
 
+    def refresh(self, refresh_ts: str | None = None):
+        """
+        Refreshes the prices, stamping every price set during the refresh with the same timestamp.
+
+        Args:
+            refresh_ts (str | None): The timestamp of the refresh, defaults to now
+        """
+        self._refresh_ts = refresh_ts or _refresh_timestamp()
+        try:
+            self.refresh_prices()
+        finally:
+            self._refresh_ts = None
+
     def refresh_prices(self):
         """
         Refreshes the prices from the fuel company's website.
@@ -236,73 +410,114 @@ class FuelCompany:
     def _get_website(self, url: str = None):
         if url is None:
             url = self._url
-        r = self._session.get(url, timeout=self._timeout)
+
+        # Prices change a few times a day at most, let the server answer 304 Not Modified
+        # and reuse the last body if nothing has changed
+        cached = self._cache.get(url)
+        headers = {}
+        if cached is not None:
+            if "ETag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if "Last-Modified" in cached.headers:
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        r = self._session.get(url, headers=headers, timeout=self._timeout)
+        if r.status_code == 304 and cached is not None:
+            return cached
+
         r.raise_for_status()
-        return r
 
-    def _get_html_soup(self, r, parser="html.parser"):
-        if r.text:
-            return BS(r.text, parser)
-        return None
+        # Only a response with a validator can be answered with a 304 later on
+        if "ETag" in r.headers or "Last-Modified" in r.headers:
+            self._cache[url] = r
+        else:
+            self._cache.pop(url, None)
+        return r
 
     def _clean_product_name(self, product_name):
         product_name = product_name.replace("Beskrivelse: ", "")
         product_name = product_name.strip()
-        if product_name[-1] == ".":
+        if product_name.endswith("."):
             product_name = product_name[:-1]
 
         return product_name
 
     def _clean_price(self, price):
-        price = str(price)  # Typecast to String
-        # Remove 'Pris inkl. moms: '
-        price = price.replace("Pris inkl. moms: ", "")
-        price = price.replace(" kr.", "")  # Remove ' kr.'
-        price = price.replace(" kr/kWh", "")  # Remove '.'
-        price = price.replace(",", ".")  # Replace ',' with '.'
-        price = price.strip()  # Remove leading or trailing whitespaces
-        # Return the price with 2 decimals
-        return f"{float(price):.2f}"
+        # Remove 'Pris inkl. moms: ' and any 'kr', 'kr.' or 'kr/kWh' in one go and use '.' as
+        # decimal mark
+        price = _PRICE_STRIP_RE.sub("", str(price)).translate(_PRICE_TRANS).strip()
+        return float(price)
 
     def _set_price(self, product_key, price_string):
-        self._products[product_key]["price"] = float(
-            self._clean_price(price_string))
-        dt = datetime.now(DK_TZ)
-        self._products[product_key]["last_update"] = dt.strftime(
-            "%d/%m/%Y, %H:%M:%S")
+        product = self._products[product_key]
+        product.price = self._clean_price(price_string)
+        # refresh_prices may also be called on its own, outside of refresh
+        product.last_update = self._refresh_ts or _refresh_timestamp()
+
+    def _get_html_tree(self, url: str = None):
+        # Hand lxml the raw bytes, decoded with the charset from the headers when there is one.
+        # Otherwise lxml sniffs the encoding from the page itself.
+        r = self._get_website(url)
+        encoding = _declared_encoding(r)
+        parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+        return lxml.html.fromstring(r.content, parser=parser)
+
+    def _iter_rows(self, url: str = None, tag: str = "tr"):
+        # Feed the page to lxml a chunk at a time and hand out each row as soon as it has been
+        # parsed, instead of building the whole tree first. Rows are freed once they are used.
+        r = self._get_website(url)
+        content = r.content
+        encoding = _declared_encoding(r)
+        if encoding:
+            parser = etree.HTMLPullParser(events=("end",), tag=tag, encoding=encoding)
+        else:
+            parser = etree.HTMLPullParser(events=("end",), tag=tag)
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
 
-    def _get_data_from_table(self, product_col, price_col):
-        # Use found_price to ensure that we only use the first price found for each product
-        found_price = []
+        def read_rows():
+            for _, row in parser.read_events():
+                yield row
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
 
-        r = self._get_website()
-        html = self._get_html_soup(r)
-        rows = html.find_all("tr")
+        for start in range(0, len(content), _PARSE_CHUNK_SIZE):
+            parser.feed(content[start:start + _PARSE_CHUNK_SIZE])
+            yield from read_rows()
 
-        for row in rows:
-            cells = row.findAll("td")
+        parser.close()
+        yield from read_rows()
+
+    def _get_data_from_table(self, product_col, price_col):
+        # Use found_price to ensure that we only use the first price found for each product,
+        # and to stop reading the table once all of our products have a price
+        found_price = set()
+        wanted = len(self._products)
+
+        # Bind the lookups used in the loop to locals
+        idx = self.products_name_key_idx
+        clean_product_name = self._clean_product_name
+        set_price = self._set_price
+
+        for row in self._iter_rows():
+            cells = _TABLE_CELLS(row)
             if cells:
-                product_name = self._clean_product_name(
-                    cells[product_col].text)
-
-                if (
-                    product_name not in found_price
-                    and product_name in self.products_name_key_idx.keys()
-                ):
-                    self._set_price(
-                        self.products_name_key_idx[product_name], cells[price_col].text
-                    )
-                    found_price.append(product_name)
-
-    def _download_file(self, url, filename, path):
-        r = self._session.get(url, stream=True, timeout=self._timeout)
+                product_key = idx.get(
+                    clean_product_name(cells[product_col].text_content()))
+
+                if product_key is not None and product_key not in found_price:
+                    set_price(product_key, cells[price_col].text_content())
+                    found_price.add(product_key)
+                    if len(found_price) == wanted:
+                        break
+
+    def _download(self, url) -> bytes:
+        r = self._session.get(url, timeout=self._timeout)
         r.raise_for_status()
-        with open(path + filename, "wb") as file:
-            for block in r.iter_content(chunk_size=1024):
-                if block:
-                    file.write(block)
+        return r.content
 
 
+@register_company("ok")
 class FuelCompanyOk(FuelCompany):
     """
     Represents the OK fuel company.
@@ -310,7 +525,7 @@ class FuelCompanyOk(FuelCompany):
     Attributes:
         _name (str): The name of the fuel company
         _url (str): The URL to fetch daily prices from
-        _products (dict[str, dict]): A dict containing the products offered by the fuel company
+        _products (dict[str, Product]): A dict containing the products offered by the fuel company
 
     Methods:
         refresh_prices: Parses the OK website to extract fuel prices for the given products
@@ -318,16 +533,10 @@ class FuelCompanyOk(FuelCompany):
 
     _name: str = "OK"
     _url: str = "https://www.ok.dk/offentlig/produkter/braendstof/priser/vejledende-standerpriser"
-    _products: dict[str, dict] = {
-        OCTANE_95: {
-            "name": "Blyfri 95"
-        },
-        OCTANE_100: {
-            "name": "Oktan 100"
-        },
-        DIESEL: {
-            "name": "Diesel"
-        }
+    _products: dict[str, Product] = {
+        OCTANE_95: Product("Blyfri 95"),
+        OCTANE_100: Product("Oktan 100"),
+        DIESEL: Product("Diesel")
     }
 
     def refresh_prices(self):
@@ -342,20 +551,18 @@ class FuelCompanyOk(FuelCompany):
             dict: A dictionary containing the updated products with prices.
         """
 
-        r = self._get_website()
-        html = self._get_html_soup(r)
-
-        rows = html.find_all("div", {"role": "row"})
+        rows = self._get_html_tree().xpath('//div[@role="row"]')
+        idx = self.products_name_key_idx
 
         for row in rows:
-            cells = row.find_all("div", {"role": "gridcell"})
+            cells = _GRID_CELLS(row)
             if cells:
-                product_name = self._clean_product_name(cells[0].text)
-                if product_name in self.products_name_key_idx.keys():
-                    self._set_price(
-                        self.products_name_key_idx[product_name], cells[1].text)
+                product_key = idx.get(self._clean_product_name(cells[0].text_content()))
+                if product_key is not None:
+                    self._set_price(product_key, cells[1].text_content())
 
 
+@register_company("shell")
 class FuelCompanyShell(FuelCompany):
     """
     Represents the Shell fuel company.
@@ -370,16 +577,18 @@ class FuelCompanyShell(FuelCompany):
     _url: str = "https://shellservice.dk/wp-json/shell-wp/v2/daily-prices"
 
     _products = {
-        OCTANE_95: {"name": "Shell FuelSave 95 oktan"},
-        OCTANE_100: {"name": "Shell V-Power 100 oktan"},
-        DIESEL: {"name": "Shell FuelSave Diesel"},
-        DIESEL_PLUS: {"name": "Shell V-Power Diesel"},
-        QUICKCHARGE: {"name": "El/kWh", "type": "electricity"}
+        OCTANE_95: Product("Shell FuelSave 95 oktan"),
+        OCTANE_100: Product("Shell V-Power 100 oktan"),
+        DIESEL: Product("Shell FuelSave Diesel"),
+        DIESEL_PLUS: Product("Shell V-Power Diesel"),
+        QUICKCHARGE: Product("El/kWh", kind="electricity")
     }
 
     def __init__(self, subscribe_products: List[str] = None):
         super().__init__(subscribe_products)
-        adp = TlsAdapter(ssl.OP_NO_TLSv1_1 | ssl.OP_NO_TLSv1_2)
+        # Shell needs its own TLS setup, so it cannot use the shared session
+        self._session = _create_session()
+        adp = TlsAdapter(ssl.OP_NO_TLSv1_1 | ssl.OP_NO_TLSv1_2, max_retries=_RETRY)
         self._session.mount("https://", adp)  # adp instead of adapter
         self._session.verify = False
 
@@ -387,20 +596,26 @@ class FuelCompanyShell(FuelCompany):
         r = self._get_website()
 
         try:
-            json_data = r.json()
+            json_data = _loads(r.content)
 
-        except requests.exceptions.JSONDecodeError as e:
+        except ValueError as e:
             _LOGGER.error("Error parsing JSON from Shell: %s", e)
             raise e
 
+        # Only our products are of interest. The last entry of a product wins, so keep its
+        # price and only clean it once.
+        idx = self.products_name_key_idx
+        prices = {}
         for product in json_data["results"]["products"]:
-            if product["name"] in self.products_name_key_idx.keys():
-                self._set_price(
-                    self.products_name_key_idx[product["name"]],
-                    product["price_incl_vat"]
-                )
+            product_key = idx.get(product["name"])
+            if product_key is not None:
+                prices[product_key] = product["price_incl_vat"]
+
+        for product_key, price in prices.items():
+            self._set_price(product_key, price)
 
 
+@register_company("circlek")
 class FuelCompanyCirclek(FuelCompany):
     """
     Represents the Circle K fuel company.
@@ -414,17 +629,18 @@ class FuelCompanyCirclek(FuelCompany):
     _url: str = "https://www.circlek.dk/priser"
 
     _products = {
-        OCTANE_95: {"name": "miles95"},
-        OCTANE_95_PLUS: {"name": "miles+95"},
-        DIESEL:  {"name": "miles Diesel"},
-        DIESEL_PLUS: {"name": "miles+ Diesel"},
-        QUICKCHARGE: {"name": "El Lynlader", "type": "electricity"}
+        OCTANE_95: Product("miles95"),
+        OCTANE_95_PLUS: Product("miles+95"),
+        DIESEL:  Product("miles Diesel"),
+        DIESEL_PLUS: Product("miles+ Diesel"),
+        QUICKCHARGE: Product("El Lynlader", kind="electricity")
     }
 
     def refresh_prices(self):
         self._get_data_from_table(1, 2)
 
 
+@register_company("f24")
 class FuelCompanyF24(FuelCompany):
     """
     Represents the F24 fuel company.
@@ -440,76 +656,84 @@ class FuelCompanyF24(FuelCompany):
     _url: str = "https://www.f24.dk/priser/"
 
     _products = {
-        OCTANE_95: {"name": "GoEasy 95 E10", "ProductCode": 22253},
-        OCTANE_95_PLUS: {"name": "GoEasy 95 Extra E5", "ProductCode": 22603},
-        DIESEL:  {"name": "GoEasy Diesel", "ProductCode": 24453},
-        DIESEL_PLUS: {"name": "GoEasy Diesel Extra", "ProductCode": 24338},
-        CHARGE: {"name": "Hurtiglader", "type": "electricity"}
+        OCTANE_95: Product("GoEasy 95 E10", product_code=22253),
+        OCTANE_95_PLUS: Product("GoEasy 95 Extra E5", product_code=22603),
+        DIESEL:  Product("GoEasy Diesel", product_code=24453),
+        DIESEL_PLUS: Product("GoEasy Diesel Extra", product_code=24338),
+        CHARGE: Product("Hurtiglader", kind="electricity")
     }
 
+    def __init__(self, subscribe_products: List[str] = None):
+        super().__init__(subscribe_products)
+
+        # The fuel products to ask for, excluding the electric products without a product code.
+        # We control the order of the returned data with an Index, so the keys are kept in the
+        # same order as the list sent to the server.
+        self._fuel_keys_by_index = [
+            k for k, v in self._products.items() if v.product_code is not None
+        ]
+        self._fuel_payload_products = [
+            {"ProductCode": self._products[k].product_code, "Index": i}
+            for i, k in enumerate(self._fuel_keys_by_index)
+        ]
+
     def refresh_fuel_prices(self):
+        if not self._fuel_keys_by_index:
+            return
+
         # F24 and Q8 returns JSON and expects us to ask with a payload in JSON
-        headers = {"Content-Type": "application/json"}
-        # Let us prepare a nice payload
         now = datetime.now()
-        payload = {}
-        # F24/Q8 wish to have a "FromDate", we use today - 31 days as timestamp
-        payload["FromDate"] = int((now - timedelta(days=31)).timestamp())
-        # Today as timestamp
-        payload["ToDate"] = int(now.timestamp())
-        # Lets cook up some wanted fueltypes with a empty list
-        payload["FuelsIdList"] = []
-        # We can control the order of the returned data with a Index
-        index = 0
-        # Loop through the products, excluding the electric products without a product code
-        for product_key, product_dict in self._products.items():
-            if "ProductCode" in product_dict:
-                product_dict["Index"] = index
-                payload["FuelsIdList"].append(product_dict)
-                index += 1
-
-        # Send our payload and headers to the URL as a POST
+        payload = {
+            # F24/Q8 wish to have a "FromDate", we use today - 31 days as timestamp
+            "FromDate": int((now - timedelta(days=31)).timestamp()),
+            # Today as timestamp
+            "ToDate": int(now.timestamp()),
+            # The wanted fueltypes
+            "FuelsIdList": self._fuel_payload_products
+        }
+
+        # Send our payload to the URL as a JSON POST
         r = self._session.post(
-            self._json_url, headers=headers,
-            data=str(payload), timeout=self._timeout
+            self._json_url, json=payload, timeout=self._timeout
         )
         r.raise_for_status()
+        products_json = _loads(r.content)["Products"]
 
-        for product_key, product_dict in self._products.items():
-            if "ProductCode" in product_dict:
-                # Extract the data of the product at the given Index from the dictionary
-                # Remember we told the server in which order we wanted the data
-                json_product = r.json()[
-                    "Products"][product_dict["Index"]]
-                # Get only the name and the price of the product
+        # A server that did not understand the payload does not answer with our products
+        if len(products_json) < len(self._fuel_keys_by_index):
+            _LOGGER.warning(
+                "%s returned %d products, expected %d",
+                self.name, len(products_json), len(self._fuel_keys_by_index))
+            return
 
-                self._set_price(
-                    product_key, json_product["PriceInclVATInclTax"])
+        # Remember we told the server in which order we wanted the data
+        for index, product_key in enumerate(self._fuel_keys_by_index):
+            self._set_price(
+                product_key, products_json[index]["PriceInclVATInclTax"])
 
     def refresh_electric_prices(self):
         # This is a bit of a hack, but it works
-        prices = self._get_html_soup(
-            self._get_website()
-        ).find_all("tr")[3].find_all("td")[1:]
+        prices = _TABLE_CELLS(list(islice(self._iter_rows(), 3, 4))[0])[1:]
 
         if len(prices) == 2:
-            if QUICKCHARGE in self.products_name_key_idx.values():
-                self._set_price(QUICKCHARGE, prices[0].text)
+            if QUICKCHARGE in self._product_keys:
+                self._set_price(QUICKCHARGE, prices[0].text_content())
             prices.pop(0)
 
-        if CHARGE in self.products_name_key_idx.values():
-            self._set_price(CHARGE, prices[0].text)
+        if CHARGE in self._product_keys:
+            self._set_price(CHARGE, prices[0].text_content())
 
     def refresh_prices(self):
         self.refresh_fuel_prices()
 
         if (
-            QUICKCHARGE in self.products_name_key_idx.values()
-            or CHARGE in self.products_name_key_idx.values()
+            QUICKCHARGE in self._product_keys
+            or CHARGE in self._product_keys
         ):
             self.refresh_electric_prices()
 
 
+@register_company("q8")
 class FuelCompanyQ8(FuelCompanyF24):
     """
     Represents the Q8 fuel company.
@@ -525,15 +749,16 @@ class FuelCompanyQ8(FuelCompanyF24):
     _url: str = "https://www.q8.dk/priser/"
 
     _products = {
-        OCTANE_95: {"name": "GoEasy 95 E10", "ProductCode": 22251},
-        OCTANE_95_PLUS: {"name": "GoEasy 95 Extra E5", "ProductCode": 22601},
-        DIESEL:  {"name": "GoEasy Diesel", "ProductCode": 24451},
-        DIESEL_PLUS: {"name": "GoEasy Diesel Extra", "ProductCode": 24337},
-        CHARGE: {"name": "Hurtiglader", "type": "electricity"},
-        QUICKCHARGE: {"name": "Lynlader", "type": "electricity"}
+        OCTANE_95: Product("GoEasy 95 E10", product_code=22251),
+        OCTANE_95_PLUS: Product("GoEasy 95 Extra E5", product_code=22601),
+        DIESEL:  Product("GoEasy Diesel", product_code=24451),
+        DIESEL_PLUS: Product("GoEasy Diesel Extra", product_code=24337),
+        CHARGE: Product("Hurtiglader", kind="electricity"),
+        QUICKCHARGE: Product("Lynlader", kind="electricity")
     }
 
 
+@register_company("ingo")
 class FuelCompanyIngo(FuelCompany):
     """
     Represents the Ingo fuel company.
@@ -547,15 +772,16 @@ class FuelCompanyIngo(FuelCompany):
     _url: str = "https://www.ingo.dk/br%C3%A6ndstofpriser/aktuelle-br%C3%A6ndstofpriser"
 
     _products = {
-        OCTANE_95: {"name": "Benzin 95"},
-        OCTANE_95_PLUS: {"name": "UPGRADE 95"},
-        DIESEL:  {"name": "Diesel"},
+        OCTANE_95: Product("Benzin 95"),
+        OCTANE_95_PLUS: Product("UPGRADE 95"),
+        DIESEL:  Product("Diesel"),
     }
 
     def refresh_prices(self):
         self._get_data_from_table(1, 2)
 
 
+@register_company("oil")
 class FuelCompanyOil(FuelCompany):
     """
     Represents the OIL! fuel company.
@@ -569,24 +795,22 @@ class FuelCompanyOil(FuelCompany):
     _url: str = "https://www.oil-tankstationer.dk/de-gaeldende-braendstofpriser/"
 
     _products = {
-        OCTANE_95: {"name": "95 E10"},
-        OCTANE_95_PLUS: {"name": "PREMIUM 98"},
-        DIESEL:  {"name": "Diesel"},
+        OCTANE_95: Product("95 E10"),
+        OCTANE_95_PLUS: Product("PREMIUM 98"),
+        DIESEL:  Product("Diesel"),
     }
 
     def refresh_prices(self):
-        r = self._get_website()
-        html = self._get_html_soup(r)
-        rows = html.find_all("tr")
-        for row in rows:
-            cells = row.find_all("td")
+        idx = self.products_name_key_idx
+        for row in self._iter_rows():
+            cells = _TABLE_CELLS(row)
             if cells:
-                product_name = self._clean_product_name(cells[0].text)
-                if product_name in self.products_name_key_idx.keys():
-                    self._set_price(
-                        self.products_name_key_idx[product_name], cells[2].text)
+                product_key = idx.get(self._clean_product_name(cells[0].text_content()))
+                if product_key is not None:
+                    self._set_price(product_key, cells[2].text_content())
 
 
+@register_company("goon")
 class FuelCompanyGoon(FuelCompany):
     """
     Represents the Go' On fuel company.
@@ -600,10 +824,12 @@ class FuelCompanyGoon(FuelCompany):
     """
     _name: str = "Go' on"
     _url: str = "https://goon.nu/priser/#Aktuellelistepriser"
+    # Seconds a single ssocr run may take
+    _ocr_timeout = 5
 
     _products = {
-        OCTANE_95: {"name": "Blyfri 95", "ocr_crop": ["58", "232", "134", "46"]},
-        "diesel":  {"name": "Transportdiesel", "ocr_crop": ["58", "289", "134", "46"]},
+        OCTANE_95: Product("Blyfri 95", ocr_crop=("58", "232", "134", "46")),
+        "diesel":  Product("Transportdiesel", ocr_crop=("58", "289", "134", "46")),
     }
 
     def refresh_prices(self):
@@ -611,7 +837,7 @@ class FuelCompanyGoon(FuelCompany):
         ssocr_bin = shutil.which("ssocr")
         if not ssocr_bin:
             _LOGGER.error(
-                "Ssocr not present - OCR of prices from Go'On not possible. " +
+                "Ssocr not present - OCR of prices from Go'On not possible. "
                 "Will fetch 'listepriser'"
             )
             self._goon_list_prices()
@@ -620,8 +846,8 @@ class FuelCompanyGoon(FuelCompany):
 
     # GO'ON - No SSOCR present, get the "listprices"
     def _goon_list_prices(self):
-        # Fetch the prices using the table-scraper function
         self._get_data_from_table(0, 7)
+
         # Since we are scraping "Listepriser" add 'priceType' : 'list' to the products
         # This is merely to send a message back to the API.
         self._price_type = "list"
@@ -629,42 +855,49 @@ class FuelCompanyGoon(FuelCompany):
     # GO'ON SSOCR present
 
     def _goon_ocr(self):
-        # Filename for the image with the prices
-        prices_file = "goon_prices.png"
-
         # Fetch the website with the prices
-        r = self._get_website()
-        html = self._get_html_soup(r)
+        html = self._get_html_tree()
 
-        # Extract the url for the image with the prices and download the file
-        pricelist_url = html.find("img", class_="lazyload")["data-src"]
+        # Extract the url for the image with the prices and download it, it is kept in memory
+        # and handed to ssocr on stdin rather than written to disk
+        pricelist_url = html.xpath(
+            '//img[contains(concat(" ", normalize-space(@class), " "), " lazyload ")]/@data-src'
+        )[0]
         _LOGGER.debug("Latest Go'On price images is this: %s", pricelist_url)
-        self._download_file(pricelist_url, prices_file, PATH)
-
-        # # Loop through the products
-        for product_key, product_dict in self._products.items():
-            # Create a command for the SSOCR
-            ocr_cmd = (
-                ["ssocr"]
-                + ["-d5"]
-                + ["-t20"]
-                + ["make_mono", "invert", "-D"]
-                + ["crop"]
-                + product_dict["ocr_crop"]
-                + [PATH + prices_file]
-            )
-            # Perform OCR on the cropped image
-            with subprocess.Popen(
-                ocr_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            ) as ocr:
-                out = ocr.communicate()
-                if out[0] != b"":
-                    _LOGGER.debug(
-                        "%s: %s", product_dict["name"], out[0].strip().decode("utf-8"))
-                    self._set_price(
-                        product_key, out[0].strip().decode("utf-8"))
+        image = self._download(pricelist_url)
 
+        # ssocr only reads one crop per run, so run it once per product
+        for product_key, product in self._products.items():
+            try:
+                price = self._goon_ssocr(image, product.ocr_crop)
+            except subprocess.TimeoutExpired:
+                _LOGGER.warning(
+                    "Ssocr timed out reading the price of %s", product.name)
+                continue
+
+            if price:
+                _LOGGER.debug("%s: %s", product.name, price)
+                self._set_price(product_key, price)
+
+    def _goon_ssocr(self, image: bytes, ocr_crop) -> str:
+        # Create a command for the SSOCR, reading the image from stdin
+        ocr_cmd = (
+            ["ssocr"]
+            + ["-d5"]
+            + ["-t20"]
+            + ["make_mono", "invert", "-D"]
+            + ["crop"]
+            + list(ocr_crop)
+            + ["-"]
+        )
+        # Perform OCR on the cropped image, a hanging ssocr is killed after the timeout
+        ocr = subprocess.run(
+            ocr_cmd, input=image, capture_output=True, timeout=self._ocr_timeout, check=False
+        )
+        return ocr.stdout.strip().decode("utf-8")
 
+
+@register_company("unox")
 class FuelCompanyUnox(FuelCompany):
     """
     Represents the UNO-X fuel company.
@@ -680,10 +913,10 @@ class FuelCompanyUnox(FuelCompany):
     _js_url: str = "https://bilist.unoxmobility.dk/umbraco/surface/PriceListData/PriceList"
 
     _products = {
-        OCTANE_95: {"name": "Blyfri 95 E10"},
-        OCTANE_95_PLUS: {"name": "Blyfri 98 E5"},
-        OCTANE_100: {"name": "Blyfri 100 E5"},
-        DIESEL:  {"name": "Diesel"},
+        OCTANE_95: Product("Blyfri 95 E10"),
+        OCTANE_95_PLUS: Product("Blyfri 98 E5"),
+        OCTANE_100: Product("Blyfri 100 E5"),
+        DIESEL:  Product("Diesel"),
     }
 
     def refresh_prices(self):
@@ -692,29 +925,38 @@ class FuelCompanyUnox(FuelCompany):
         # "DateUnixEpoc":1700407231,"Product":"Blyfri 100 E5","ListPriceExclVat":13.431,
         # "ListPriceInclVat":16.79,"PumpPrice":14.78}
         r = self._get_website(url=self._js_url)
-        # iterate over each matching pattern
-        for match in re.finditer(r"({\"Date[^}]*})", r.text):
-            json_string = match.group(0)
-            # parse the JSON string
-            json_data = json.loads(json_string)
+
+        # Bind the lookups used in the loop to locals
+        idx = self.products_name_key_idx
+        products = self._products
+        set_price = self._set_price
+
+        for json_data in self._parse_prices(r.content):
             # check if the product is in our list
-            if json_data["Product"] in self.products_name_key_idx.keys():
-
-                if (
-                    "DateUnixEpoc" not in self._products[
-                        self.products_name_key_idx[json_data["Product"]]
-                    ] or
-                        self._products[
-                            self.products_name_key_idx[json_data["Product"]]
-                    ]["DateUnixEpoc"] <= json_data['DateUnixEpoc']
-                ):
-
-                    # set the price
-                    self._set_price(
-                        self.products_name_key_idx[json_data["Product"]],
-                        json_data["PumpPrice"]
-                    )
-
-                    self._products[
-                        self.products_name_key_idx[json_data["Product"]]
-                    ]["DateUnixEpoc"] = json_data['DateUnixEpoc']
+            product_key = idx.get(json_data["Product"])
+            if product_key is None:
+                continue
+
+            # only use the price if it is at least as recent as the one we have
+            product = products[product_key]
+            epoch = json_data["DateUnixEpoc"]
+            if product.date_unix is None or product.date_unix <= epoch:
+                set_price(product_key, json_data["PumpPrice"])
+                product.date_unix = epoch
+
+    @staticmethod
+    def _parse_prices(content: bytes):
+        # Should the endpoint answer with proper JSON, a list of prices or an ASP.NET style
+        # {"d": [...]} envelope, parse it in one go
+        try:
+            json_data = _loads(content)
+        except ValueError:
+            json_data = None
+
+        if isinstance(json_data, dict):
+            json_data = json_data.get("d")
+        if isinstance(json_data, list):
+            return json_data
+
+        # Otherwise pick out the price objects one by one
+        return (_loads(match.group(0)) for match in _UNOX_RE.finditer(content))
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import logging
 from datetime import timedelta
 from homeassistant.const import ATTR_ATTRIBUTION
@@ -22,8 +21,7 @@ from .const import (
 )
 
 
-_LOGGER: logging.Logger = logging.getLogger(__package__)
-_LOGGER = logging.getLogger(__name__)
+_LOGGER: logging.Logger = logging.getLogger(__name__)
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
@@ -34,11 +32,8 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     async def async_update_data():
         # Retrieve the client stored in the hass data stack
         fuel_prices = hass.data[DOMAIN][CONF_CLIENT]
-        # Loop through the fuelcompanies and call the refresh function
-        # Sleep for 3 seconds
-        for _, company in fuel_prices.companies.items():
-            await hass.async_add_executor_job(company.refresh_prices)
-            await asyncio.sleep(3)
+        # Refresh all the fuelcompanies at once
+        await fuel_prices.async_refresh()
 
     # Create a coordinator
     coordinator = DataUpdateCoordinator(
@@ -73,12 +68,9 @@ class FuelPriceSensor(SensorEntity):
         self._coordinator = coordinator
         self._fuel_company = hass.data[DOMAIN][CONF_CLIENT].companies[company_key]
         self._company_name = self._fuel_company.name
-        self._product_name = self._fuel_company.products[product_key]["name"]
+        self._product_name = self._fuel_company.products[product_key].name
         self._product_key = product_key
-        if (
-            "type" in self._fuel_company.products[product_key]
-                and self._fuel_company.products[product_key]["type"] == "electricity"
-        ):
+        if self._fuel_company.products[product_key].kind == "electricity":
             self._icon = "mdi:flash"
         else:
             self._icon = "mdi:gas-station"
@@ -99,8 +91,11 @@ class FuelPriceSensor(SensorEntity):
         return self._icon
 
     @property
-    def state(self) -> float:
-        return round(float(self._fuel_company.products[self._product_key]["price"]), 2)
+    def state(self) -> float | None:
+        price = self._fuel_company.products[self._product_key].price
+        if price is None:
+            return None
+        return round(price, 2)
 
     @property
     def extra_state_attributes(self):
@@ -110,7 +105,7 @@ class FuelPriceSensor(SensorEntity):
         attr["product_name"] = self._product_name
         attr["product_type"] = self._product_key
         attr["price_type"] = self._fuel_company.price_type
-        attr["last_update"] = self._fuel_company.products[self._product_key]["last_update"]
+        attr["last_update"] = self._fuel_company.products[self._product_key].last_update
         attr[ATTR_ATTRIBUTION] = CREDITS
         return attr
 
@@ -45,11 +45,11 @@ for company, products in test_companies.items():
         try:
             print(
                 f'{f.companies[company].name:10s} {product:12s} ' +
-                f'{f.companies[company].products[product]["name"]:23s} ' +
-                f'{f.companies[company].products[product]["price"]:6.2f} '
+                f'{f.companies[company].products[product].name:23s} ' +
+                f'{f.companies[company].products[product].price:6.2f} '
             )
 
-        except KeyError:
+        except (KeyError, TypeError):
             print(
                 f'KeyError: {product} or price not found (company: {
                     company})'